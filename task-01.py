@@ -1,17 +1,158 @@
+import ctypes
 import mmh3
 # Імпорт необхідних типів для анотації, що покращує читабельність та перевірку коду.
-from typing import List, Dict, Union
+from typing import Callable, Iterator, List, Dict, Optional, Tuple, Union
+
+# ----------------------------------------------------------------------
+
+# Розмір кеш-лінії в байтах і розмір блоку у бітах: одна кеш-лінія (64 байти = 512 бітів).
+_CACHE_LINE = 64
+_BLOCK_BITS = _CACHE_LINE * 8
+# Мінімальне K, з якого скомпільований _add_core швидший за розгорнуті перевірки
+# (нижче цього порогу вартість виклику через Numba більша за сам цикл).
+_JIT_MIN_HASHES = 4
+
+# Скомпільований _add_core: None — ще не компілювався, False — Numba недоступна.
+_compiled_add_core = None
+
+def _add_core(bits: bytearray, base: int, first: int, step: int, block_mask: int, num_hashes: int) -> None:
+    """
+    Встановлює в 1 усі K бітів елемента в його блоці (цикл для BloomFilter.add, який
+    компілює Numba — див. _get_compiled_add_core).
+
+    :param bits: Упакований бітовий масив фільтра (8 бітів у байті).
+    :param base: Номер першого біта блоку, обраного для елемента.
+    :param first: Позиція першого біта всередині блоку.
+    :param step: Крок подвійного хешування всередині блоку (непарний).
+    :param block_mask: Розмір блоку - 1 (розмір блоку — степінь двійки).
+    """
+    bit = first
+    for _ in range(num_hashes):
+        # Байт index >> 3, біт index & 7 усередині нього.
+        index = base + bit
+        bits[index >> 3] |= 1 << (index & 7)
+        # (first + i * step) mod B інкрементально: для B = 2^n модуль — це побітове AND з маскою.
+        bit = (bit + step) & block_mask
+
+def _get_compiled_add_core() -> Optional[Callable[..., None]]:
+    """
+    Повертає _add_core, скомпільований Numba, або None, якщо Numba недоступна.
+    Numba (необов'язкова залежність) імпортується лише тут, при першому фільтрі з
+    K >= _JIT_MIN_HASHES: інші фільтри (зокрема демо з K = 3) її не потребують, а сам імпорт
+    займає помітну частку часу запуску скрипта. Перевірки окремих елементів (contains)
+    не компілюються зовсім: виклик через диспетчер Numba на кожен елемент дорожчий
+    за розгорнуті K перевірок.
+    """
+    global _compiled_add_core
+    if _compiled_add_core is None:
+        try:
+            from numba import njit
+        except ImportError:
+            _compiled_add_core = False
+        else:
+            _compiled_add_core = njit(cache=True)(_add_core)
+    return _compiled_add_core or None
+
+def _specialize(bits: bytearray, num_hashes: int, size_shift: int, block_shift: int,
+                block_mask: int, origin: int) -> Tuple[Callable[[str], None], Callable[[str], bool]]:
+    """
+    Генерує спеціалізовані функції add та contains для конкретного фільтра.
+    Параметри фільтра і K підставлено в код як константи, перевірка аргументу та всі K
+    перевірок розгорнуті в тілі функції, тож на елемент припадає один Python-виклик без
+    звертань до атрибутів об'єкта. Лише add з K >= _JIT_MIN_HASHES (за наявності Numba)
+    встановлює біти скомпільованим циклом _add_core (див. _get_compiled_add_core).
+    Номери бітів збігаються з BloomFilter._indices (та сама схема, без циклу).
+
+    :param bits: Упакований бітовий масив фільтра (8 бітів у байті).
+    :param num_hashes: Кількість бітів (K) на елемент.
+    :param size_shift: log2 розміру фільтра в бітах.
+    :param block_shift: log2 розміру блоку.
+    :param block_mask: Розмір блоку - 1 (розмір блоку — степінь двійки).
+    :param origin: Номер біта в bits, з якого починається перший (вирівняний) блок.
+    :return: Пара функцій (add, contains), що приймають елемент (рядок).
+    """
+    validate = ["    if not item or not isinstance(item, str):"]
+    # Один хеш замість K викликів mmh3.hash з різними 'seed'. mmh3 хешує рядок у UTF-8 сам,
+    # без item.encode(), а 32-бітний результат (зі знаком, без keyword-аргументів) — найдешевший:
+    # операції над ним не потребують довгої арифметики 64-бітних цілих.
+    # Молодші size_shift бітів хешу — номер першого біта: старші з них обирають блок, молодші
+    # block_shift — позицію в ньому. Фільтр понад 2^32 бітів бере хеш mmh3.hash64.
+    hash_bits = 32 if size_shift <= 32 else 64
+    first_lines = [
+        "    h = _hash(item)" if hash_bits == 32 else "    h = _hash64(item)[0]",
+        f"    offset = h & {(1 << size_shift) - 1}",
+        f"    index = offset + {origin}",
+    ]
+    # Подвійне хешування (Кірш–Міценмахер) всередині блоку: i-й біт = (first + i * step) mod B.
+    # Крок — з бітів хешу над номером першого біта, а якщо їх не вистачає — з другого хешу.
+    # Крок робимо непарним: для B = 2^n він тоді взаємно простий з B, і всі K позицій різні (за K <= B).
+    if size_shift + block_shift <= hash_bits:
+        step_source = f"h >> {size_shift}"
+    else:
+        step_source = "_hash(item, 1)"
+    step_lines = [
+        f"    bit = offset & {block_mask}",
+        "    base = index - bit",
+        f"    step = ({step_source}) | 1",
+    ]
+
+    add_lines = ["def add(item):"] + validate + ["        return"] + first_lines
+    contains_lines = ["def contains(item):"] + validate + ["        return False"] + first_lines
+    # Скомпільований цикл окуповує вартість виклику через Numba лише для add з великим K.
+    # contains завжди розгорнуто: промах зазвичай виходить на першій-другій перевірці.
+    compiled_add = _get_compiled_add_core() if num_hashes >= _JIT_MIN_HASHES else None
+    if compiled_add is not None:
+        add_lines += step_lines
+        add_lines.append(f"    _add_core(bits, base, bit, step, {block_mask}, {num_hashes})")
+    for i in range(num_hashes):
+        if i == 1:
+            # Крок потрібен лише з другої перевірки: промах у contains часто обходиться без нього.
+            if compiled_add is None:
+                add_lines += step_lines
+            contains_lines += step_lines
+        if i:
+            # (first + i * step) mod B інкрементально: для B = 2^n модуль — це побітове AND з маскою.
+            next_lines = [f"    bit = (bit + step) & {block_mask}", "    index = base + bit"]
+            if compiled_add is None:
+                add_lines += next_lines
+            contains_lines += next_lines
+        # Байт index >> 3, біт index & 7 усередині нього.
+        if compiled_add is None:
+            add_lines.append("    bits[index >> 3] |= 1 << (index & 7)")
+        # Якщо хоча б один з необхідних бітів дорівнює 0, це означає, що елемент ТОЧНО не був доданий.
+        contains_lines += [
+            "    if not (bits[index >> 3] >> (index & 7)) & 1:",
+            "        return False",
+        ]
+    # Якщо всі K бітів встановлені в 1, елемент, ймовірно, присутній.
+    contains_lines.append("    return True")
+
+    namespace = {
+        "_hash": mmh3.hash,
+        "_hash64": mmh3.hash64,
+        "_add_core": compiled_add,
+        "bits": bits,
+    }
+    exec("\n".join(add_lines + contains_lines), namespace)
+    return namespace["add"], namespace["contains"]
+
+# ----------------------------------------------------------------------
 
 class BloomFilter:
     """
     Реалізація фільтра Блума для швидкої, імовірнісної перевірки наявності елементів.
     Використовується для економії пам'яті, оскільки не зберігає самі елементи.
+
+    Фільтр блоковий: бітовий масив поділено на блоки розміром з кеш-лінію, і всі K бітів
+    елемента лежать в одному блоці. Перевірка торкається однієї кеш-лінії замість K
+    випадкових, ціною трохи вищої частки хибнопозитивних спрацьовувань.
     """
     def __init__(self, size: int, num_hashes: int):
         """
         Конструктор класу BloomFilter.
 
         :param size: Розмір бітового масиву (кількість бітів, M). Чим більше, тим менше хибнопозитивних спрацьовувань.
+                     Округлюється вгору до найближчого степеня двійки.
         :param num_hashes: Кількість хеш-функцій (K), які будуть використані для кожного елемента.
         """
         # Перевірка вхідних параметрів: вони мають бути додатними цілими числами.
@@ -19,10 +160,81 @@ class BloomFilter:
                 isinstance(num_hashes, int) and num_hashes > 0):
             raise ValueError("Size та num_hashes мають бути додатними цілими числами.")
             
-        self.size: int = size
+        # Округлюємо розмір до степеня двійки, щоб замінити ділення за модулем (% size)
+        # на швидке побітове AND з маскою (як для індексу регістра в HyperLogLog)
+        # і щоб масив ділився на блоки без залишку.
+        self.size: int = 1 << (size - 1).bit_length()
         self.num_hashes: int = num_hashes
+        # Параметри блоків: малий фільтр (size < 512) складається з одного блоку.
+        self.block_bits: int = min(_BLOCK_BITS, self.size)
+        self.block_mask: int = self.block_bits - 1
+        self.block_shift: int = self.block_bits.bit_length() - 1
+        self.num_blocks: int = self.size >> self.block_shift
+        self.size_shift: int = self.size.bit_length() - 1
         # Ініціалізація бітового масиву нулями. Кожен елемент (біт) позначає, чи було встановлено певний індекс.
-        self.bit_array: List[int] = [0] * size
+        self._build()
+
+    def _build(self) -> None:
+        """
+        Виділяє вирівняний бітовий масив і генерує для нього спеціалізовані add/contains.
+        Викликається з __init__ та __setstate__ (після копіювання чи unpickle адреса буфера інша).
+        """
+        # Біти упаковані по 8 у байт bytearray: M бітів займають M / 8 байтів,
+        # що у 8 разів менше, ніж один байт на біт, і краще поміщається в кеш.
+        # Буфер bytearray вирівняний лише на 16 байтів, тож блок у 64 байти зазвичай
+        # перетинав би дві кеш-лінії. Виділяємо запас і починаємо блоки з адреси,
+        # кратної розміру кеш-лінії: усі K перевірок елемента читають рівно одну лінію.
+        self.bit_array: bytearray = bytearray(((self.size + 7) >> 3) + _CACHE_LINE - 1)
+        address = ctypes.addressof(ctypes.c_char.from_buffer(self.bit_array))
+        self.origin: int = (-address % _CACHE_LINE) << 3
+        # Спеціалізовані під цей фільтр функції з розгорнутими K перевірками. Вони зберігаються
+        # як атрибути екземпляра і перекривають методи add/contains класу: виклик bloom.add(item)
+        # одразу потрапляє в розгорнутий код, без проміжного виклику методу.
+        # Функції прив'язані саме до цього bit_array, тому не копіюються (див. __getstate__).
+        self.add, self.contains = _specialize(self.bit_array, self.num_hashes, self.size_shift,
+                                              self.block_shift, self.block_mask, self.origin)
+
+    def __getstate__(self) -> Dict[str, object]:
+        """
+        Стан для pickle та copy/deepcopy: параметри фільтра і самі біти (без запасу на вирівнювання).
+        Згенеровані функції та origin не зберігаються — __setstate__ створює їх заново.
+        """
+        state = self.__dict__.copy()
+        for name in ("add", "contains", "bit_array", "origin"):
+            del state[name]
+        start = self.origin >> 3
+        state["bits"] = bytes(self.bit_array[start:start + ((self.size + 7) >> 3)])
+        return state
+
+    def __setstate__(self, state: Dict[str, object]) -> None:
+        """ Відновлює фільтр зі стану __getstate__ у новому вирівняному масиві. """
+        state = dict(state)
+        bits = state.pop("bits")
+        self.__dict__.update(state)
+        self._build()
+        start = self.origin >> 3
+        self.bit_array[start:start + len(bits)] = bits
+
+    def _indices(self, item: str) -> Iterator[int]:
+        """
+        Повертає номери K бітів елемента в bit_array (та сама схема, що й у _specialize, але циклом).
+
+        :param item: Коректний (непорожній) рядок.
+        """
+        # Один хеш замість K: молодші size_shift бітів — номер першого біта (блок і позиція в ньому).
+        hash_bits = 32 if self.size_shift <= 32 else 64
+        h = mmh3.hash(item) if hash_bits == 32 else mmh3.hash64(item)[0]
+        offset = h & (self.size - 1)
+        bit = offset & self.block_mask
+        base = offset - bit + self.origin
+        # Непарний крок подвійного хешування — зі старших бітів хешу або з другого хешу.
+        if self.size_shift + self.block_shift <= hash_bits:
+            step = (h >> self.size_shift) | 1
+        else:
+            step = mmh3.hash(item, 1) | 1
+        for _ in range(self.num_hashes):
+            yield base + bit
+            bit = (bit + step) & self.block_mask
 
     def add(self, item: str) -> None:
         """
@@ -34,21 +246,13 @@ class BloomFilter:
         if not item or not isinstance(item, str):
              return
         
-        # mmh3 краще працює з байтами. Перетворюємо рядок у послідовність байтів (UTF-8).
-        data = item.encode('utf-8')
-
-        # Обчислюємо num_hashes різних хешів
-        for i in range(self.num_hashes):
-            # Використовуємо лічильник 'i' як 'seed' (початкове значення) для mmh3.
-            # Зміна 'seed' забезпечує, що кожен виклик дає інший хеш.
-            # signed=False гарантує, що результат хешу буде позитивним.
-            hash_value = mmh3.hash(data, i, signed=False)
-            
-            # Обмежуємо хеш-значення розміром масиву (M) за допомогою операції modulo.
-            index = hash_value % self.size
-            
-            # Встановлюємо біт за обчисленим індексом в 1.
-            self.bit_array[index] = 1
+        # Звичайно цей метод перекрито розгорнутою функцією екземпляра (див. __init__);
+        # тут — той самий алгоритм циклом по K.
+        # Обчислюємо num_hashes різних індексів і встановлюємо всі відповідні біти в 1.
+        bits = self.bit_array
+        for index in self._indices(item):
+            # Байт index >> 3, біт index & 7 усередині нього.
+            bits[index >> 3] |= 1 << (index & 7)
 
     def contains(self, item: str) -> bool:
         """
@@ -62,19 +266,13 @@ class BloomFilter:
         if not item or not isinstance(item, str):
              return False
         
-        # Перетворення на байти для коректного хешування.
-        data = item.encode('utf-8')
-
-        # Обчислюємо ті ж num_hashes індексів.
-        for i in range(self.num_hashes):
-            # Обчислення хешу з тим самим 'seed' для отримання того ж індексу.
-            hash_value = mmh3.hash(data, i, signed=False)
-            index = hash_value % self.size
-            
+        # Обчислюємо ті ж num_hashes індексів і перевіряємо відповідні біти.
+        bits = self.bit_array
+        for index in self._indices(item):
             # Якщо хоча б один з необхідних бітів дорівнює 0, це означає, що елемент ТОЧНО не був доданий.
-            if self.bit_array[index] == 0:
+            if not (bits[index >> 3] >> (index & 7)) & 1:
                 return False
-                
+
         # Якщо всі K бітів встановлені в 1, елемент, ймовірно, присутній.
         return True
 
@@ -89,6 +287,8 @@ def check_password_uniqueness(bloom_filter: BloomFilter, new_passwords: List[Uni
     :return: Словник {пароль: статус}, де статус — "унікальний" або "вже використаний" тощо.
     """
     results: Dict[str, str] = {}
+    # Кеш статусів уже перевірених паролів: повторний пароль не хешується і не перевіряється у фільтрі ще раз.
+    seen: Dict[str, str] = {}
     
     # Ітерація по кожному паролю в списку
     for password in new_passwords:
@@ -99,13 +299,18 @@ def check_password_uniqueness(bloom_filter: BloomFilter, new_passwords: List[Uni
             results[key] = "некоректний або порожній"
             continue 
 
-        # Використовуємо метод contains() фільтра Блума для перевірки.
-        if bloom_filter.contains(password):
-            # Якщо contains() повертає True, це означає, що пароль, ймовірно, вже був доданий.
-            results[password] = "вже використаний"
-        else:
-            # Якщо contains() повертає False, пароль точно не був доданий (це унікальний пароль).
-            results[password] = "унікальний"
+        # Пароль уже перевірявся в цьому списку: використовуємо збережений статус.
+        status = seen.get(password)
+        if status is None:
+            # Використовуємо метод contains() фільтра Блума для перевірки.
+            if bloom_filter.contains(password):
+                # Якщо contains() повертає True, це означає, що пароль, ймовірно, вже був доданий.
+                status = "вже використаний"
+            else:
+                # Якщо contains() повертає False, пароль точно не був доданий (це унікальний пароль).
+                status = "унікальний"
+            seen[password] = status
+        results[password] = status
             
     return results
 